@@ -0,0 +1,451 @@
+"""
+Shared async HTTP client for the product image scripts.
+
+Requires httpx with HTTP/2 support (pip install -r scripts/requirements.txt).
+Without the h2 package the client warns and falls back to HTTP/1.1; Brotli
+adds br-compressed pages, and selectolax finds the main image with a C HTML
+parser before trying regex.
+
+Set AMAZON_API_KEY to a ScraperAPI key to resolve whole catalogs through its
+async structured-data endpoint in one batch (see AmazonClient.prefetch); any
+ASIN the batch can't resolve, and every ASIN when the key is unset, falls back
+to scraping the product page.
+
+Usage:
+    async with AmazonClient() as client:
+        await client.prefetch(asins)  # optional
+        img = await client.get_image(asin)
+"""
+
+import asyncio
+import email.utils
+import json
+import os
+import random
+import re
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, TypeVar
+
+import httpx
+
+from _products import Checkpointer
+from _progress import log
+
+# httpx decodes gzip/deflate itself, and brotli too when the Brotli package
+# is installed -- only advertise what we can actually decode
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# HTTP/2 multiplexes every request to a host over one connection; httpx needs h2 for it
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# selectolax 1.0 dropped the Modest backend (selectolax.parser); Lexbor has shipped since 0.3
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+TIMEOUT = httpx.Timeout(15.0)
+CONCURRENCY = 10  # Max requests in flight at once
+REQUESTS_PER_SECOND = 1.0  # Per-host rate limit
+KEEPALIVE_TIMEOUT = 30
+RETRIES = 4  # Attempts per URL before a throttled response is treated as a failure
+RETRYABLE_STATUS = (429, 503)
+CACHE_FILE = Path(__file__).parent / ".asin_cache.json"
+CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached image URL is fetched again
+AMAZON_API_KEY = os.environ.get("AMAZON_API_KEY")
+BATCH_API_URL = "https://async.scraperapi.com/structured/amazon/product"
+BATCH_POLL_INTERVAL = 5  # Seconds between job status checks
+BATCH_TIMEOUT = 600  # Give up on unfinished batch jobs after this long
+
+# Matches whichever image marker appears first (data-old-hires attribute or the
+# hiRes/large/main keys of the colorImages JSON) in a single pass over the page.
+# Bytes pattern so it can run on the raw stream; the closing quote keeps a URL cut
+# off at the end of a partial buffer from matching.
+_RE_IMAGE = re.compile(
+    rb'(?:data-old-hires="|"(?:hiRes|large|main)"\s*:\s*\{?\s*")'
+    rb'(https://m\.media-amazon\.com/images/I/[^"]+)"'
+)
+MIN_PAGE_SIZE = 10000  # 404 and captcha pages are tiny
+CHUNK_SIZE = 16384
+SCAN_INTERVAL = 65536  # Re-run the regex each time this many new bytes arrive
+SCAN_OVERLAP = 2048  # Re-scan this much of the old buffer so markers split across chunks still match
+# Scanning a page takes well under a millisecond, while shipping a 64KB slice to a
+# worker process costs about as much again in pickling and IPC. Offloading only
+# pays off once a run scans enough pages (~1K+) for regex time to compete with
+# network waits on the event loop; below that, scan inline.
+PROCESS_SCAN_THRESHOLD = 1000
+
+
+class RateLimiter:
+    """Async token bucket allowing `requests_per_second` requests, with bursts up to `burst`."""
+
+    def __init__(self, requests_per_second: float = 1.0, burst: int = 1):
+        self.rate = requests_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Hold back every caller on this host for `seconds`, e.g. after a 429/503."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """Wait until a token is available, then consume it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+T = TypeVar("T")
+
+
+def retry_after(resp: httpx.Response) -> float | None:
+    """Seconds the server asked us to wait via Retry-After (delta-seconds or HTTP-date), if any."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+async def read_text(resp: httpx.Response) -> str:
+    """Read the whole (streamed) response body as text."""
+    await resp.aread()
+    return resp.text
+
+
+def find_landing_image(html: bytes, pos: int = 0) -> str | None:
+    """Read data-old-hires off the landing image with selectolax, if it is installed."""
+    if HTMLParser is None:
+        return None
+    html = bytes(html[pos:])
+    node = HTMLParser(html).css_first("img#landingImage")
+    url = node.attributes.get("data-old-hires") if node else None
+    if not url or not url.startswith("https://m.media-amazon.com/images/I/"):
+        return None
+    # selectolax happily parses a tag cut off mid-attribute at the end of a
+    # partial buffer; only trust the URL if its closing quote has arrived
+    if f'{url}"'.encode() not in html:
+        return None
+    return url
+
+
+def find_image_in_html(html: bytes, pos: int = 0) -> str | None:
+    """Try to find product image URL in (possibly partial) HTML, starting at `pos`.
+
+    Uses the landing image node when selectolax is available, and falls back to
+    the combined regex for non-standard page layouts.
+    """
+    url = find_landing_image(html, pos)
+    if url:
+        return url
+    m = _RE_IMAGE.search(html, pos)
+    return m.group(1).decode("utf-8", errors="replace") if m else None
+
+
+async def scan_inline(buf: bytearray, pos: int) -> str | None:
+    return find_image_in_html(buf, pos)
+
+
+async def read_until_image(
+    resp: httpx.Response,
+    scan: Callable[[bytearray, int], Awaitable[str | None]] = scan_inline,
+) -> str | None:
+    """Stream the response body and stop scanning as soon as an image URL is found.
+
+    Over HTTP/2 the rest of the page is never downloaded. On HTTP/1.1 leaving a
+    body unread makes httpcore close the socket, so the remainder is drained
+    (without scanning) to keep the connection in the pool.
+    """
+    buf = bytearray()
+    scanned = 0
+    chunks = resp.aiter_bytes(CHUNK_SIZE)
+    async for chunk in chunks:
+        buf += chunk
+        if len(buf) - scanned >= SCAN_INTERVAL:
+            img = await scan(buf, max(0, scanned - SCAN_OVERLAP))
+            if img:
+                if resp.http_version != "HTTP/2":
+                    async for _ in chunks:
+                        pass
+                return img
+            scanned = len(buf)
+    if len(buf) < MIN_PAGE_SIZE:
+        return None
+    return await scan(buf, max(0, scanned - SCAN_OVERLAP))
+
+
+class AsinCache:
+    """Persistent ASIN -> image URL cache, so reruns skip pages fetched in the last CACHE_TTL."""
+
+    def __init__(self, path: Path = CACHE_FILE, ttl: float = CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        try:
+            entries: dict = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {}
+        # Drop stale and malformed entries so the file doesn't grow with every run
+        now = time.time()
+        self.entries = {
+            k: v
+            for k, v in entries.items()
+            if isinstance(v, dict)
+            and isinstance(v.get("url"), str)
+            and isinstance(v.get("ts"), (int, float))
+            and now - v["ts"] < ttl
+        }
+        self.checkpoint = Checkpointer(self.entries, save=self._save)
+
+    def _save(self, entries: dict):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, indent=2))
+        tmp.replace(self.path)
+
+    def get(self, asin: str) -> str | None:
+        """Return the cached image URL for `asin` if it is still fresh."""
+        entry = self.entries.get(asin)
+        if entry and time.time() - entry["ts"] < self.ttl:
+            return entry["url"]
+        return None
+
+    def put(self, asin: str, url: str):
+        self.entries[asin] = {"url": url, "ts": time.time()}
+        self.checkpoint.mark()
+
+    async def flush(self):
+        await self.checkpoint.flush()
+
+
+class AmazonClient:
+    """Pooled, rate-limited httpx client for fetching product pages and images."""
+
+    def __init__(
+        self,
+        concurrency: int = CONCURRENCY,
+        rps: float = REQUESTS_PER_SECOND,
+        use_cache: bool = True,
+        process_scan: bool = False,
+    ):
+        """Set `process_scan` to run image regex scans in a process pool; see PROCESS_SCAN_THRESHOLD."""
+        self.sem = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.rps = rps
+        # One limiter per hostname, so unrelated retailers don't throttle each other
+        self.limiters: dict[str, RateLimiter] = {}
+        self.http: httpx.AsyncClient | None = None
+        self.cache = AsinCache() if use_cache else None
+        self.process_scan = process_scan
+        self.executor: ProcessPoolExecutor | None = None
+        self.prefetched: dict[str, str] = {}
+
+    async def __aenter__(self):
+        # One pooled client for the whole run. Over HTTP/2 all requests to a host
+        # share a single TCP/TLS connection; on HTTP/1.1 kept-alive sockets are reused.
+        self.http = httpx.AsyncClient(
+            http2=HTTP2,
+            headers=HEADERS,
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.concurrency * 2,
+                max_keepalive_connections=self.concurrency * 2,
+                keepalive_expiry=KEEPALIVE_TIMEOUT,
+            ),
+        )
+        if not HTTP2:
+            log("  [WARN] h2 not installed, falling back to HTTP/1.1 (pip install -r scripts/requirements.txt)")
+        if self.process_scan:
+            self.executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+        if self.cache:
+            await self.cache.flush()
+
+    async def _scan(self, buf: bytearray, pos: int) -> str | None:
+        """Scan `buf` from `pos` for an image URL, in the process pool when enabled."""
+        if self.executor is None:
+            return find_image_in_html(buf, pos)
+        loop = asyncio.get_running_loop()
+        # Only ship the unscanned slice to the worker
+        return await loop.run_in_executor(self.executor, find_image_in_html, bytes(buf[pos:]))
+
+    def limiter_for(self, url: str) -> RateLimiter:
+        """Return the rate limiter for the host of `url`, creating it on first use."""
+        host = urllib.parse.urlsplit(url).hostname or ""
+        if host not in self.limiters:
+            self.limiters[host] = RateLimiter(self.rps)
+        return self.limiters[host]
+
+    async def _request(self, url: str, read: Callable[[httpx.Response], Awaitable[T]]) -> T:
+        """GET `url` and pass the streamed response to `read`.
+
+        429/503 responses are retried with exponential backoff plus jitter (or
+        the server's Retry-After, if longer), and the backoff pauses the host's rate limiter so other requests to it wait
+        too. Raises httpx.HTTPStatusError on other errors or once RETRIES run out.
+        """
+        limiter = self.limiter_for(url)
+        attempt = 0
+        while True:
+            # Wait for the host's token before taking a slot, so requests queued
+            # behind a slow host don't starve the others
+            await limiter.acquire()
+            async with self.sem:
+                async with self.http.stream("GET", url) as resp:
+                    status = resp.status_code
+                    if status not in RETRYABLE_STATUS or attempt == RETRIES - 1:
+                        resp.raise_for_status()
+                        return await read(resp)
+            # Never retry sooner than the server allows
+            delay = max(2 ** attempt + random.random(), retry_after(resp) or 0)
+            log(f"  [{status}] Throttled by {resp.url.host}, backing off {delay:.1f}s...")
+            limiter.pause(delay)
+            attempt += 1
+
+    async def get_text(self, url: str) -> str:
+        """Fetch URL and return HTML content, or "" on any error."""
+        try:
+            return await self._request(url, read_text)
+        except Exception:
+            return ""
+
+    async def prefetch(self, asins: Iterable[str | None]):
+        """Resolve `asins` with one batch API request, so get_image() can skip scraping them.
+
+        No-op unless AMAZON_API_KEY is set. Failures are logged and leave the
+        affected ASINs to be scraped as usual.
+        """
+        if not AMAZON_API_KEY:
+            return
+        todo = [a for a in dict.fromkeys(asins) if a and not (self.cache and self.cache.get(a))]
+        if not todo:
+            return
+        try:
+            resp = await self.http.post(
+                BATCH_API_URL, json={"apiKey": AMAZON_API_KEY, "asins": todo, "tld": "com"}
+            )
+            resp.raise_for_status()
+            jobs = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            log(f"  [BATCH] Batch lookup failed, falling back to scraping: {e}")
+            return
+        if not isinstance(jobs, list):
+            log(f"  [BATCH] Unexpected batch response, falling back to scraping: {jobs!r:.200}")
+            return
+        jobs = [job for job in jobs if isinstance(job, dict)]
+        deadline = time.monotonic() + BATCH_TIMEOUT
+        results = await asyncio.gather(*(self._await_batch_job(job, deadline) for job in jobs))
+        for asin, image_url in results:
+            if asin and image_url:
+                self.prefetched[asin] = image_url
+                if self.cache:
+                    self.cache.put(asin, image_url)
+        log(f"  [BATCH] Resolved {len(self.prefetched)}/{len(todo)} ASINs via API")
+
+    async def _await_batch_job(self, job: dict, deadline: float) -> tuple[str | None, str | None]:
+        """Poll one batch job until it finishes; returns (asin, first image URL)."""
+        asin = job.get("asin")
+        status_url = job.get("statusUrl")
+        while status_url and time.monotonic() < deadline:
+            try:
+                resp = await self.http.get(status_url)
+                resp.raise_for_status()
+                data = resp.json()
+            except httpx.HTTPStatusError as e:
+                # The job is paid for: keep polling through throttling and server
+                # errors, only give up on a client error such as an unknown job
+                if e.response.status_code < 500 and e.response.status_code not in RETRYABLE_STATUS:
+                    return asin, None
+                await asyncio.sleep(BATCH_POLL_INTERVAL)
+                continue
+            except (httpx.TransportError, ValueError):
+                # Connection/pool timeouts and truncated bodies are transient
+                await asyncio.sleep(BATCH_POLL_INTERVAL)
+                continue
+            if not isinstance(data, dict):
+                return asin, None
+            if data.get("status") == "failed":
+                return asin, None
+            if data.get("status") == "finished":
+                response = data.get("response")
+                body = response.get("body") if isinstance(response, dict) else None
+                if isinstance(body, str):
+                    try:
+                        body = json.loads(body)
+                    except ValueError:
+                        return asin, None
+                images = body.get("images") if isinstance(body, dict) else None
+                if isinstance(images, list) and images and isinstance(images[0], str):
+                    return asin, images[0]
+                return asin, None
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+        return asin, None
+
+    async def get_image(self, asin: str) -> str | None:
+        """Fetch main product image URL from Amazon product page, using the cache when fresh."""
+        if asin in self.prefetched:
+            return self.prefetched[asin]
+        if self.cache and (cached := self.cache.get(asin)):
+            return cached
+        image_url = await self._fetch_image(asin)
+        if image_url and self.cache:
+            self.cache.put(asin, image_url)
+        return image_url
+
+    async def _fetch_image(self, asin: str) -> str | None:
+        url = f"https://www.amazon.com/dp/{asin}"
+        try:
+            image_url = await self._request(url, lambda resp: read_until_image(resp, self._scan))
+        except httpx.HTTPStatusError as e:
+            log(f"  [HTTP {e.response.status_code}] Failed to fetch {asin}")
+            return None
+        except Exception as e:
+            log(f"  [ERROR] Failed to fetch {asin}: {e}")
+            return None
+        if not image_url:
+            log(f"  [WARN] No image URL found in HTML for ASIN {asin}")
+        return image_url
@@ -0,0 +1,78 @@
+"""
+Shared products.json helpers for the image scripts.
+
+orjson is used for reads and writes when installed; the stdlib fallback
+produces byte-identical output.
+"""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PRODUCTS_FILE = Path(__file__).parent.parent / "data" / "products.json"
+CHECKPOINT_EVERY = 25  # Save progress after this many updated products
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def load_products() -> dict:
+    """Read and parse products.json."""
+    raw = PRODUCTS_FILE.read_bytes()
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def dump_products(data: dict) -> bytes:
+    """Serialize the catalog the same way the JS scripts do (2-space indent, raw UTF-8)."""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode()
+
+
+def save_products(data: dict):
+    """Write products.json in one buffered write, via a temp file so a crash can't truncate it."""
+    payload = dump_products(data)
+    tmp = PRODUCTS_FILE.with_suffix(".json.tmp")
+    with open(tmp, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(payload)
+    os.replace(tmp, PRODUCTS_FILE)
+
+
+def is_placeholder(url: str) -> bool:
+    return "placehold.co" in url or "unsplash.com" in url
+
+
+class Checkpointer:
+    """Debounced saves of `data` (products.json by default): flushes in the background every `every` updates."""
+
+    def __init__(
+        self,
+        data: dict,
+        every: int = CHECKPOINT_EVERY,
+        save: Callable[[dict], None] = save_products,
+    ):
+        self.data = data
+        self.every = every
+        self.save = save
+        self.pending = 0
+        self.task: asyncio.Task | None = None
+
+    def mark(self):
+        """Record one update, scheduling a save once enough have piled up."""
+        self.pending += 1
+        if self.pending >= self.every and (self.task is None or self.task.done()):
+            self.pending = 0
+            # Snapshot on the loop thread: updates made while the save runs
+            # would otherwise resize the dict mid-serialization
+            self.task = asyncio.create_task(asyncio.to_thread(self.save, dict(self.data)))
+
+    async def flush(self):
+        """Wait for any in-flight checkpoint, then do the final save."""
+        if self.task:
+            await self.task
+        self.save(self.data)
@@ -0,0 +1,88 @@
+"""
+Batched progress output for the concurrent image scripts.
+
+Shows a tqdm progress bar when tqdm is installed; otherwise log blocks are
+written to stdout in batches.
+"""
+
+import asyncio
+import contextvars
+import sys
+from typing import Any, Awaitable, Iterable
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+PROGRESS_BATCH = 10  # Completed items per stdout write
+
+# Lines logged while a gather_with_progress item runs, appended to its block
+_item_log: contextvars.ContextVar[list[str] | None] = contextvars.ContextVar("item_log", default=None)
+
+
+def log(msg: str):
+    """Print a line without tearing the progress bar.
+
+    Inside a gather_with_progress item the line is held back and written with
+    that item's block instead.
+    """
+    lines = _item_log.get()
+    if lines is not None:
+        lines.append(msg)
+    elif tqdm:
+        tqdm.write(msg)
+    else:
+        print(msg)
+
+
+async def _indexed(i: int, aw: Awaitable[tuple[Any, str]]) -> tuple[int, Any, str]:
+    lines: list[str] = []
+    _item_log.set(lines)  # Each item runs in its own task, so this stays local to it
+    result, block = await aw
+    return i, result, "\n".join(filter(None, [block, *lines]))
+
+
+async def gather_with_progress(coros: Iterable[Awaitable[tuple[Any, str]]], desc: str = "Products") -> list:
+    """Like asyncio.gather for coroutines returning (result, log block), with batched output.
+
+    Results come back in input order, and so do the log blocks, along with any
+    log() lines each coroutine emitted. Blocks are written every PROGRESS_BATCH
+    items instead of one print per item, so concurrent coroutines don't all
+    contend for stdout.
+    """
+    indexed = [asyncio.ensure_future(_indexed(i, c)) for i, c in enumerate(coros)]
+    results = [None] * len(indexed)
+    blocks: dict[int, str] = {}
+    next_block = 0
+    bar = tqdm(total=len(indexed), desc=desc) if tqdm else None
+    pending: list[str] = []
+
+    def flush():
+        if not pending:
+            return
+        text = "\n".join(pending)
+        if bar:
+            bar.write(text)
+        else:
+            sys.stdout.write(text + "\n")
+            sys.stdout.flush()
+        pending.clear()
+
+    for next_done in asyncio.as_completed(indexed):
+        i, result, block = await next_done
+        results[i] = result
+        blocks[i] = block
+        # Hold finished blocks until every earlier item is done too
+        while next_block in blocks:
+            if block := blocks.pop(next_block):
+                pending.append(block)
+            next_block += 1
+        if bar:
+            bar.update()
+        if len(pending) >= PROGRESS_BATCH:
+            flush()
+    flush()
+    if bar:
+        bar.close()
+    return results
@@ -1,10 +1,7 @@
 #!/usr/bin/env python3
 """Apply final image URLs to products.json for remaining products."""
 
-import json
-from pathlib import Path
-
-PRODUCTS_FILE = Path(__file__).parent.parent / "data" / "products.json"
+from _products import is_placeholder, load_products, save_products
 
 # Final image URLs for remaining products
 FINAL_IMAGES = {
@@ -21,11 +18,12 @@ FINAL_IMAGES = {
 
 
 def main():
-    with open(PRODUCTS_FILE) as f:
-        data = json.load(f)
+    data = load_products()
+    products = data["products"]
     
     updated = 0
-    for product in data["products"]:
+    still_placeholder = []
+    for product in products:
         pid = product["id"]
         if pid in FINAL_IMAGES:
             old = product["image"]
@@ -34,22 +32,20 @@ def main():
             print(f"  Old: {old[:60]}")
             print(f"  New: {FINAL_IMAGES[pid]}")
             updated += 1
+        # Tally remaining placeholders in the same pass
+        if is_placeholder(product.get("image", "")):
+            still_placeholder.append(product)
     
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    save_products(data)
     
     print(f"\n✅ Updated {updated} products")
     
-    # Count placeholders remaining
-    placeholders = sum(1 for p in data["products"] if "placehold.co" in p.get("image", "") or "unsplash.com" in p.get("image", ""))
-    real = len(data["products"]) - placeholders
-    print(f"📊 Real images: {real}/{len(data['products'])}")
-    if placeholders > 0:
+    real = len(products) - len(still_placeholder)
+    print(f"📊 Real images: {real}/{len(products)}")
+    if still_placeholder:
         print("⚠️  Still placeholder:")
-        for p in data["products"]:
-            img = p.get("image", "")
-            if "placehold.co" in img or "unsplash.com" in img:
-                print(f"  [{p['id']}] {p['title'][:50]}")
+        for p in still_placeholder:
+            print(f"  [{p['id']}] {p['title'][:50]}")
 
 
 if __name__ == "__main__":
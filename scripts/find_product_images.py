@@ -1,107 +1,60 @@
 #!/usr/bin/env python3
 """
 Find real product images by searching Amazon and other retailer sites.
+
+Requires httpx (pip install -r scripts/requirements.txt); see _amazon_client.py for optional extras.
 """
 
-import json
+import asyncio
 import re
-import time
-import urllib.request
-import urllib.error
 import urllib.parse
-from pathlib import Path
-
-PRODUCTS_FILE = Path(__file__).parent.parent / "data" / "products.json"
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    "Accept-Encoding": "gzip, deflate, br",
-}
+from _amazon_client import AmazonClient
+from _products import Checkpointer, is_placeholder, load_products
+from _progress import gather_with_progress
 
-
-def fetch_url(url: str) -> str:
-    """Fetch URL and return HTML content."""
-    try:
-        req = urllib.request.Request(url, headers=HEADERS)
-        import gzip
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            data = resp.read()
-            # Handle gzip
-            try:
-                html = gzip.decompress(data).decode("utf-8", errors="replace")
-            except Exception:
-                html = data.decode("utf-8", errors="replace")
-        return html
-    except Exception as e:
-        return ""
-
-
-def find_image_in_html(html: str) -> str | None:
-    """Try to find product image URL in HTML."""
-    patterns = [
-        r'data-old-hires="(https://m\.media-amazon\.com/images/I/[^"]+)"',
-        r'"hiRes":\s*"(https://m\.media-amazon\.com/images/I/[^"]+)"',
-        r'"large":\s*"(https://m\.media-amazon\.com/images/I/[^"]+)"',
-        r'"main":\s*\{.*?"(https://m\.media-amazon\.com/images/I/[^"]+)"',
-    ]
-    for p in patterns:
-        m = re.search(p, html)
-        if m:
-            return m.group(1)
-    return None
+_RE_SEARCH_ASIN = re.compile(r'/dp/([A-Z0-9]{10})/')
+_RE_SEPHORA_SKU = re.compile(r'(https://www\.sephora\.com/productimages/sku/s\d+-main-[A-Za-z0-9]+\.jpg)')
+_RE_SEPHORA_THUMB = re.compile(r'"thumbnail":\s*"(https://[^"]+sephora[^"]+\.jpg)"')
+_RE_ULTA_IMAGE = re.compile(r'"image":\s*"(https://media\.ulta\.com/[^"]+)"')
 
 
-def fetch_amazon_by_asin(asin: str) -> str | None:
-    """Fetch Amazon product image by ASIN."""
-    url = f"https://www.amazon.com/dp/{asin}"
-    html = fetch_url(url)
-    if len(html) < 10000:  # 404 pages are tiny
-        return None
-    return find_image_in_html(html)
-
-
-def search_amazon_for_product(query: str) -> list[str]:
+async def search_amazon_for_product(client: AmazonClient, query: str) -> list[str]:
     """Search Amazon for a product and return ASINs."""
     encoded = urllib.parse.quote(query)
     url = f"https://www.amazon.com/s?k={encoded}&i=beauty"
-    html = fetch_url(url)
-    asins = re.findall(r'/dp/([A-Z0-9]{10})/', html)
+    html = await client.get_text(url)
+    asins = _RE_SEARCH_ASIN.findall(html)
     return list(dict.fromkeys(asins))[:5]
 
 
-def fetch_sephora_image(product_name: str) -> str | None:
+async def fetch_sephora_image(client: AmazonClient, product_name: str) -> str | None:
     """Try to find product image on Sephora."""
     encoded = urllib.parse.quote(product_name)
     url = f"https://www.sephora.com/search?keyword={encoded}"
-    html = fetch_url(url)
+    html = await client.get_text(url)
     # Sephora uses CDN images
-    m = re.search(r'(https://www\.sephora\.com/productimages/sku/s\d+-main-[A-Za-z0-9]+\.jpg)', html)
+    m = _RE_SEPHORA_SKU.search(html)
     if m:
         return m.group(1)
     # Try their image CDN
-    m = re.search(r'"thumbnail":\s*"(https://[^"]+sephora[^"]+\.jpg)"', html)
+    m = _RE_SEPHORA_THUMB.search(html)
     if m:
         return m.group(1)
     return None
 
 
-def fetch_ulta_image(product_name: str) -> str | None:
+async def fetch_ulta_image(client: AmazonClient, product_name: str) -> str | None:
     """Try to find product image on Ulta."""
     encoded = urllib.parse.quote(product_name)
     url = f"https://www.ulta.com/search?search={encoded}"
-    html = fetch_url(url)
-    m = re.search(r'"image":\s*"(https://media\.ulta\.com/[^"]+)"', html)
+    html = await client.get_text(url)
+    m = _RE_ULTA_IMAGE.search(html)
     if m:
         return m.group(1)
     return None
 
 
-def is_placeholder(url: str) -> bool:
-    return "placehold.co" in url or "unsplash.com" in url
-
-
 # Products that still need real images after first pass
 PRODUCTS_TO_FIX = {
     5: {
@@ -337,69 +290,118 @@ PRODUCTS_TO_FIX = {
 }
 
 
-def main():
-    with open(PRODUCTS_FILE) as f:
-        data = json.load(f)
+async def find_on_amazon(client: AmazonClient, info: dict) -> tuple[str, str] | None:
+    """Try the known ASINs, then Amazon search results. Returns (image, source)."""
+    for asin in info["asins"]:
+        img = await client.get_image(asin)
+        if img:
+            return img, f"ASIN {asin}"
+    
+    # If no luck with ASINs, try Amazon search
+    asins = await search_amazon_for_product(client, info["search"])
+    for asin in [a for a in asins if a not in info["asins"]][:3]:  # Don't retry ones we already tried
+        img = await client.get_image(asin)
+        if img:
+            return img, f"search ASIN {asin}"
+    return None
+
+
+async def find_on_sephora(client: AmazonClient, info: dict) -> tuple[str, str] | None:
+    img = await fetch_sephora_image(client, info["title"])
+    return (img, "Sephora") if img else None
+
+
+async def find_on_ulta(client: AmazonClient, info: dict) -> tuple[str, str] | None:
+    img = await fetch_ulta_image(client, info["title"])
+    return (img, "Ulta") if img else None
+
+
+async def first_found(*lookups):
+    """Run lookups concurrently, returning the first non-empty result in priority order.
+
+    Lookups are ranked by argument position: a later one is only used once every
+    earlier one has come back empty, however fast it finished. The rest are
+    cancelled as soon as a result is chosen.
+    """
+    tasks = [asyncio.create_task(lookup) for lookup in lookups]
+    try:
+        for task in tasks:
+            result = await task
+            if result:
+                return result
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resolve_product(
+    client: AmazonClient,
+    checkpoint: Checkpointer,
+    pid: int,
+    info: dict,
+    product: dict | None,
+) -> tuple[bool | None, str]:
+    """Find a real image for one product, preferring Amazon over Sephora, then Ulta.
+
+    Returns None if the product was skipped, otherwise whether an image was found,
+    plus the output block for this product.
+    """
+    if not product:
+        return None, f"[{pid}] Product not found!"
+    
+    # Skip if already has a real Amazon image
+    if not is_placeholder(product.get("image", "")):
+        return None, f"[{pid}] Already has real image: {product['image'][:60]}"
+    
+    # Retailers are on different hosts with their own rate limits, so all three
+    # run at once; the fuzzy search-page matches from Sephora/Ulta are only
+    # taken when the exact ASIN lookups on Amazon come up empty
+    found = await first_found(
+        find_on_amazon(client, info),
+        find_on_sephora(client, info),
+        find_on_ulta(client, info),
+    )
+    
+    lines = [f"\n[{pid}] {info['title'][:55]}"]
+    if found:
+        img, source = found
+        lines.append(f"  ✓ Found via {source}: {img}")
+        product["image"] = img
+        checkpoint.mark()
+    else:
+        lines.append(f"  ✗ Could not find image")
+    return found is not None, "\n".join(lines)
+
+
+async def main():
+    data = load_products()
     
     products_by_id = {p["id"]: p for p in data["products"]}
     
-    updated = 0
-    failed = []
+    checkpoint = Checkpointer(data)
+    async with AmazonClient() as client:
+        await client.prefetch(
+            asin
+            for pid, info in PRODUCTS_TO_FIX.items()
+            if pid in products_by_id and is_placeholder(products_by_id[pid].get("image", ""))
+            for asin in info["asins"]
+        )
+        tasks = [
+            resolve_product(client, checkpoint, pid, info, products_by_id.get(pid))
+            for pid, info in PRODUCTS_TO_FIX.items()
+        ]
+        results = await gather_with_progress(tasks)
     
-    for pid, info in PRODUCTS_TO_FIX.items():
-        product = products_by_id.get(pid)
-        if not product:
-            print(f"[{pid}] Product not found!")
-            continue
-        
-        # Skip if already has a real Amazon image
-        if not is_placeholder(product.get("image", "")):
-            print(f"[{pid}] Already has real image: {product['image'][:60]}")
-            continue
-        
-        title = info["title"]
-        print(f"\n[{pid}] {title[:55]}")
-        
-        found_image = None
-        
-        # Try each ASIN
-        for asin in info["asins"]:
-            print(f"  Trying ASIN: {asin}")
-            img = fetch_amazon_by_asin(asin)
-            if img:
-                found_image = img
-                print(f"  ✓ Found image via ASIN {asin}: {img}")
-                break
-            time.sleep(1.5)
-        
-        # If no luck with ASINs, try Amazon search
-        if not found_image:
-            print(f"  Searching Amazon for: {info['search']}")
-            asins = search_amazon_for_product(info["search"])
-            print(f"  Search returned ASINs: {asins}")
-            
-            for asin in asins[:3]:
-                if asin not in info["asins"]:  # Don't retry ones we already tried
-                    print(f"  Trying search ASIN: {asin}")
-                    img = fetch_amazon_by_asin(asin)
-                    if img:
-                        found_image = img
-                        print(f"  ✓ Found via search: {img}")
-                        break
-                    time.sleep(1.5)
-        
-        if found_image:
-            product["image"] = found_image
-            updated += 1
-        else:
-            print(f"  ✗ Could not find image")
-            failed.append(title)
-        
-        time.sleep(1)
+    updated = sum(1 for r in results if r is True)
+    failed = [
+        info["title"]
+        for info, r in zip(PRODUCTS_TO_FIX.values(), results)
+        if r is False
+    ]
     
     # Save
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    await checkpoint.flush()
     
     print(f"\n✅ Fixed {updated} products")
     if failed:
@@ -409,4 +411,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,21 +1,15 @@
 #!/usr/bin/env python3
 """
 Fix products that got placeholder images by trying correct ASINs.
+
+Requires httpx (pip install -r scripts/requirements.txt); see _amazon_client.py for optional extras.
 """
 
-import json
-import re
-import time
-import urllib.request
-import urllib.error
-from pathlib import Path
+import asyncio
 
-PRODUCTS_FILE = Path(__file__).parent.parent / "data" / "products.json"
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-}
+from _amazon_client import AmazonClient
+from _products import Checkpointer, is_placeholder, load_products
+from _progress import gather_with_progress
 
 # Correct ASINs for products that had broken links
 # These were verified by searching Amazon directly
@@ -69,92 +63,60 @@ CORRECT_ASINS = {
 }
 
 
-def fetch_amazon_image(asin: str) -> str | None:
-    """Fetch main product image URL from Amazon product page."""
-    url = f"https://www.amazon.com/dp/{asin}"
-    try:
-        req = urllib.request.Request(url, headers=HEADERS)
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            html = resp.read().decode("utf-8", errors="replace")
-        
-        # Try data-old-hires first (main product image)
-        m = re.search(r'data-old-hires="(https://m\.media-amazon\.com/images/I/[^"]+)"', html)
-        if m:
-            return m.group(1)
-        
-        # Try hiRes from colorImages JSON
-        m = re.search(r'"hiRes":\s*"(https://m\.media-amazon\.com/images/I/[^"]+)"', html)
-        if m:
-            return m.group(1)
-        
-        # Try large from colorImages
-        m = re.search(r'"large":\s*"(https://m\.media-amazon\.com/images/I/[^"]+)"', html)
-        if m:
-            return m.group(1)
-            
-        print(f"  [WARN] No image URL found in HTML for ASIN {asin}")
-        return None
-    except urllib.error.HTTPError as e:
-        if e.code == 503:
-            print(f"  [503] Throttled for {asin}, waiting 5s...")
-            time.sleep(5)
-            return fetch_amazon_image(asin)  # retry once
-        print(f"  [HTTP {e.code}] Failed to fetch {asin}")
-        return None
-    except Exception as e:
-        print(f"  [ERROR] Failed to fetch {asin}: {e}")
-        return None
+async def fix_product(
+    client: AmazonClient,
+    checkpoint: Checkpointer,
+    product: dict,
+) -> tuple[bool | None, str]:
+    """Try the mapped ASIN for one product.
 
-
-def is_placeholder(url: str) -> bool:
-    return "placehold.co" in url or "unsplash.com" in url
+    Returns None if the product already had a real image, otherwise whether it was
+    fixed, plus the output block for this product.
+    """
+    pid = product["id"]
+    title = product["title"]
+    
+    # Skip if already has a real image
+    if not is_placeholder(product.get("image", "")):
+        return None, f"[{pid}] OK: {title[:50]}"
+    
+    asin = CORRECT_ASINS.get(pid)
+    if not asin:
+        return False, f"[{pid}] No ASIN mapping for: {title[:50]}"
+    
+    image_url = await client.get_image(asin)
+    
+    lines = [f"[{pid}] Fetching {title[:50]}", f"  ASIN: {asin}"]
+    if image_url:
+        lines.append(f"  ✓ Found: {image_url}")
+        product["image"] = image_url
+        checkpoint.mark()
+    else:
+        lines.append(f"  ✗ Still needs placeholder")
+    return image_url is not None, "\n".join(lines)
 
 
-def main():
-    with open(PRODUCTS_FILE) as f:
-        data = json.load(f)
+async def main():
+    data = load_products()
     
     products = data["products"]
     print(f"Fixing placeholder images...\n")
     
-    updated = 0
-    still_placeholder = 0
+    checkpoint = Checkpointer(data)
+    async with AmazonClient() as client:
+        await client.prefetch(
+            CORRECT_ASINS.get(p["id"]) for p in products if is_placeholder(p.get("image", ""))
+        )
+        results = await gather_with_progress(fix_product(client, checkpoint, p) for p in products)
     
-    for product in products:
-        pid = product["id"]
-        title = product["title"]
-        
-        # Skip if already has a real image
-        if not is_placeholder(product.get("image", "")):
-            print(f"[{pid}] OK: {title[:50]}")
-            continue
-        
-        asin = CORRECT_ASINS.get(pid)
-        if not asin:
-            print(f"[{pid}] No ASIN mapping for: {title[:50]}")
-            still_placeholder += 1
-            continue
-        
-        print(f"[{pid}] Fetching {title[:50]}")
-        print(f"  ASIN: {asin}")
-        
-        image_url = fetch_amazon_image(asin)
-        if image_url:
-            print(f"  ✓ Found: {image_url}")
-            product["image"] = image_url
-            updated += 1
-        else:
-            print(f"  ✗ Still needs placeholder")
-            still_placeholder += 1
-        
-        time.sleep(2)  # Be respectful of rate limits
+    updated = sum(1 for r in results if r is True)
+    still_placeholder = sum(1 for r in results if r is False)
     
     # Save updated products
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    await checkpoint.flush()
     
     print(f"\n✅ Done! Fixed: {updated}, Still placeholders: {still_placeholder}")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
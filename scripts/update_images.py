@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Resolve real images for every placeholder product in a single pass.
+
+Runs the find -> fix -> apply pipeline (find_product_images.py,
+fix_missing_images.py, apply_final_images.py) as one idempotent step:
+products.json is read once, each placeholder product tries its candidate
+ASINs, then the hand-picked FINAL_IMAGES, then a generated placeholder,
+and the result is written once.
+
+Requires httpx (pip install -r scripts/requirements.txt); see _amazon_client.py for optional extras.
+"""
+
+import asyncio
+
+from _amazon_client import PROCESS_SCAN_THRESHOLD, AmazonClient
+from _products import Checkpointer, is_placeholder, load_products
+from _progress import gather_with_progress
+from apply_final_images import FINAL_IMAGES
+from fetch_product_images import extract_asin, placeholder_url
+from find_product_images import PRODUCTS_TO_FIX, search_amazon_for_product
+from fix_missing_images import CORRECT_ASINS
+
+
+def candidate_asins(product: dict) -> list[str]:
+    """Primary ASIN from the affiliate link, then the known fallbacks, without repeats."""
+    pid = product["id"]
+    asins = [
+        extract_asin(product.get("affiliateUrl", "")),
+        CORRECT_ASINS.get(pid),
+        *PRODUCTS_TO_FIX.get(pid, {}).get("asins", []),
+    ]
+    return list(dict.fromkeys(a for a in asins if a))
+
+
+async def resolve(client: AmazonClient, product: dict) -> tuple[str, str | None]:
+    """Return (image URL, where it came from); the source is None for a placeholder."""
+    pid = product["id"]
+    tried = candidate_asins(product)
+    for asin in tried:
+        img = await client.get_image(asin)
+        if img:
+            return img, f"ASIN {asin}"
+
+    search = PRODUCTS_TO_FIX.get(pid, {}).get("search")
+    if search:
+        asins = await search_amazon_for_product(client, search)
+        for asin in [a for a in asins if a not in tried][:3]:
+            img = await client.get_image(asin)
+            if img:
+                return img, f"search ASIN {asin}"
+
+    if pid in FINAL_IMAGES:
+        return FINAL_IMAGES[pid], "FINAL_IMAGES"
+    return placeholder_url(product["title"]), None
+
+
+async def update_product(
+    client: AmazonClient, checkpoint: Checkpointer, product: dict
+) -> tuple[bool, str]:
+    """Resolve and set the image for one placeholder product.
+
+    Returns whether it got a real image, plus the output block for this product.
+    """
+    image, source = await resolve(client, product)
+    product["image"] = image
+    checkpoint.mark()
+
+    pid = product["id"]
+    title = product["title"]
+    if source:
+        return True, f"[{pid}] ✓ {title[:50]} ({source})\n  {image}"
+    return False, f"[{pid}] ✗ {title[:50]} (placeholder)"
+
+
+async def main():
+    data = load_products()
+    products = data["products"]
+
+    pending = [p for p in products if is_placeholder(p.get("image", ""))]
+    print(f"Resolving {len(pending)} placeholder images...\n")
+
+    checkpoint = Checkpointer(data)
+    async with AmazonClient(process_scan=len(pending) >= PROCESS_SCAN_THRESHOLD) as client:
+        # Only the primary ASIN: resolve() stops at the first hit, so batching the
+        # fallbacks would pay for lookups that are almost never read
+        await client.prefetch(asins[0] for p in pending if (asins := candidate_asins(p)))
+        results = await gather_with_progress(update_product(client, checkpoint, p) for p in pending)
+
+    await checkpoint.flush()
+
+    updated = sum(results)
+    print(f"\n✅ Updated {updated} products")
+    print(f"📊 Real images: {len(products) - (len(pending) - updated)}/{len(products)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())